@@ -1,11 +1,42 @@
+import asyncio
+import atexit
+import json
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+import time
+import weakref
+from collections import deque, OrderedDict
+from functools import partial
+from itertools import islice
+from concurrent.futures import Future, ThreadPoolExecutor
+try:
+    from collections.abc import Mapping
+except ImportError:  # pragma: no cover
+    from collections import Mapping
+import click
 from flask import current_app
+from flask.cli import AppGroup
+from requests import Session
+from requests.adapters import HTTPAdapter
 from pystmark import (send, send_batch, get_delivery_stats, get_bounces,
                       get_bounce, get_bounce_dump, get_bounce_tags,
-                      activate_bounce, Message as _Message)
+                      activate_bounce, Message as _Message, Sender,
+                      BatchSender, DeliveryStats, Bounces, Bounce, BounceDump,
+                      BounceTags, BounceActivate, PystmarkError,
+                      MessageError, MAX_BATCH_MESSAGES)
 from __about__ import __version__, __title__, __description__
 
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
 __all__ = ['__version__', '__title__', '__description__', 'Pystmark',
-           'Message']
+           'AsyncPystmark', 'Message', 'Outbox', 'BulkSendResponse',
+           'QueuedResponse', 'QueueFullError']
 
 
 class Pystmark(object):
@@ -24,16 +55,40 @@ class Pystmark(object):
     def init_app(self, app):
         ''' Initialize Pystmark with a Flask app '''
         app.pystmark = self
+        app.extensions['pystmark'] = _PystmarkState(app)
+        app.cli.add_command(cli)
+
+    def close(self, app=None):
+        '''Close the app's pooled connections to the Postmark API, after
+        waiting for messages queued with :meth:`send_async` or
+        :meth:`send_batch_async` to be sent. This is done automatically at
+        interpreter shutdown. A new pool is created if another request is made
+        afterwards.
+
+        :param app: Flask app whose pool to close. Defaults to `current_app`.
+        '''
+        state = self._get_state(app)
+        if state is not None:
+            state.close()
 
     def send(self, message, **request_args):
         '''Send a message.
 
+        If PYSTMARK_OUTBOX is set, the message is saved in the outbox and
+        sent later by :meth:`drain_outbox`, instead.
+
         :param message: Message to send.
         :type message: `dict` or :class:`Message`
         :param \\*\\*request_args: Keyword arguments to pass to
             :func:`requests.request`.
-        :rtype: :class:`pystmark.SendResponse`
+        :rtype: :class:`pystmark.SendResponse`, or :class:`QueuedResponse`
+            if the message was saved in the outbox.
         '''
+        state = self._get_state()
+        if state is not None and state.outbox is not None:
+            message_id = state.outbox.put(message, request_args)
+            state.notify_outbox_worker()
+            return QueuedResponse(message_id)
         return self._pystmark_call(send, message, **request_args)
 
     def send_batch(self, messages, **request_args):
@@ -47,6 +102,124 @@ class Pystmark(object):
         '''
         return self._pystmark_call(send_batch, messages, **request_args)
 
+    def send_bulk(self, messages, **request_args):
+        '''Send any number of messages. They are split into batches of at
+        most PYSTMARK_BULK_BATCH_SIZE messages, and up to
+        PYSTMARK_BULK_PARALLELISM batches are sent at the same time. To send
+        more messages than fit in memory, use :meth:`send_stream`.
+
+        If sending a batch raises an exception, batches that have not started
+        are cancelled and the exception is re-raised once the batches in
+        progress are done. Other batches may have been sent.
+
+        :param messages: Messages to send.
+        :type message: A list of `dict` or :class:`Message`
+        :param \\*\\*request_args: Keyword arguments to pass to
+            :func:`requests.request`.
+        :rtype: :class:`BulkSendResponse`
+        '''
+        if not messages:
+            raise MessageError('No messages to send.')
+        return BulkSendResponse(list(self.send_stream(messages,
+                                                      **request_args)))
+
+    def send_stream(self, messages, **request_args):
+        '''Send messages from an iterable, such as a generator, in batches
+        of at most PYSTMARK_BULK_BATCH_SIZE messages. Messages are only taken
+        from the iterable when there is room for another batch, so no more
+        than PYSTMARK_BULK_PARALLELISM batches are held in memory and sent
+        at the same time.
+
+        If the returned iterator is closed before it is exhausted, batches
+        that have not started are cancelled.
+
+        :param messages: Messages to send.
+        :type message: An iterable of `dict` or :class:`Message`
+        :param \\*\\*request_args: Keyword arguments to pass to
+            :func:`requests.request`.
+        :rtype: An iterator of :class:`pystmark.BatchSendResponse`, one for
+            each batch, in the order sent.
+        '''
+        config = current_app.config
+        size = min(config.get('PYSTMARK_BULK_BATCH_SIZE', MAX_BATCH_MESSAGES),
+                   MAX_BATCH_MESSAGES)
+        in_flight = max(config.get('PYSTMARK_BULK_PARALLELISM', 4), 1)
+        app = current_app._get_current_object()
+        return self._send_batches(app, _batches(messages, size), in_flight,
+                                  request_args)
+
+    def send_async(self, message, **request_args):
+        '''Send a message in a background thread. The current app context
+        is available to the thread.
+
+        :param message: Message to send.
+        :type message: `dict` or :class:`Message`
+        :param \\*\\*request_args: Keyword arguments to pass to
+            :func:`requests.request`.
+        :raises: :class:`QueueFullError` if the queue is full and
+            PYSTMARK_ASYNC_QUEUE_FULL is ``'raise'``.
+        :rtype: :class:`concurrent.futures.Future` resolving to a
+            :class:`pystmark.SendResponse`. If the queue is full and
+            PYSTMARK_ASYNC_QUEUE_FULL is ``'drop'``, the future is cancelled.
+        '''
+        return self._submit(self.send, message, **request_args)
+
+    def send_batch_async(self, messages, **request_args):
+        '''Send a batch of messages in a background thread. The current
+        app context is available to the thread.
+
+        :param messages: Messages to send.
+        :type message: A list of `dict` or :class:`Message`
+        :param \\*\\*request_args: Keyword arguments to pass to
+            :func:`requests.request`.
+        :raises: :class:`QueueFullError` if the queue is full and
+            PYSTMARK_ASYNC_QUEUE_FULL is ``'raise'``.
+        :rtype: :class:`concurrent.futures.Future` resolving to a
+            :class:`pystmark.BatchSendResponse`. If the queue is full and
+            PYSTMARK_ASYNC_QUEUE_FULL is ``'drop'``, the future is cancelled.
+        '''
+        return self._submit(self.send_batch, messages, **request_args)
+
+    def drain_outbox(self, limit=MAX_BATCH_MESSAGES):
+        '''Send a batch of messages from the outbox. Messages are removed
+        from the outbox once Postmark has responded to them. Messages that
+        Postmark rejects are logged and removed. If the batch can not be
+        sent, its messages are retried after PYSTMARK_OUTBOX_VISIBILITY_TIMEOUT
+        seconds.
+
+        This is called by a background thread, unless PYSTMARK_OUTBOX_WORKER
+        is `False`.
+
+        :param limit: Maximum number of messages to send.
+        :rtype: The number of messages taken from the outbox.
+        '''
+        state = self._get_state()
+        outbox = None if state is None else state.outbox
+        if outbox is None:
+            raise RuntimeError('PYSTMARK_OUTBOX is not configured')
+        rows = outbox.reserve(limit)
+        groups = OrderedDict()
+        for row_id, message, request_args in rows:
+            groups.setdefault(request_args, []).append((row_id, message))
+        logger = current_app.logger
+        for request_args, group in groups.items():
+            try:
+                resp = self.send_batch([message for _, message in group],
+                                       **json.loads(request_args))
+                resp.raise_for_status()
+            except Exception:
+                logger.exception('Failed to send %d messages from the outbox, '
+                                 'they will be retried', len(group))
+                continue
+            for (row_id, _), confirmation in zip(group, resp.messages):
+                if confirmation.error_code:
+                    logger.error('Postmark rejected message %d from the '
+                                 'outbox: %s [ErrorCode %s]', row_id,
+                                 confirmation.message,
+                                 confirmation.error_code)
+            outbox.ack([row_id for row_id, _ in group])
+        return len(rows)
+
     def get_delivery_stats(self, **request_args):
         '''Get delivery stats for your Postmark account.
 
@@ -109,8 +282,53 @@ class Pystmark(object):
         settings
         '''
         kwargs = self._apply_config(**kwargs)
+        state = self._get_state()
+        if state is not None:
+            method = state.resolve(method)
         return method(*args, **kwargs)
 
+    def _submit(self, method, *args, **kwargs):
+        ''' Queues a call to `method` on the app's worker pool, to be run
+        inside the current app's context
+        '''
+        app = current_app._get_current_object()
+        state = self._get_state(app)
+        if state is None:
+            raise RuntimeError('Pystmark was not initialized with this app')
+        return state.executor.submit(_call_in_app_context, app, method,
+                                     *args, **kwargs)
+
+    def _send_batches(self, app, batches, in_flight, request_args):
+        ''' Sends batches from an iterable in worker threads, keeping up to
+        `in_flight` of them in progress. Yields the responses in order.
+        '''
+        executor = ThreadPoolExecutor(max_workers=in_flight)
+        pending = deque()
+        try:
+            for batch in batches:
+                pending.append(executor.submit(_call_in_app_context, app,
+                                               self.send_batch, batch,
+                                               **request_args))
+                if len(pending) >= in_flight:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def _get_state(app=None):
+        '''Returns the :class:`_PystmarkState` of an app, or `None` if
+        the app was not initialized with :class:`Pystmark`.
+
+        :param app: Flask app. Defaults to `current_app`.
+        '''
+        if app is None:
+            app = current_app
+        return app.extensions.get('pystmark')
+
     @staticmethod
     def _apply_config(**kwargs):
         '''Adds the current_app's pystmark configuration to a dict. If a
@@ -129,6 +347,613 @@ class Pystmark(object):
         return kwargs
 
 
+class AsyncPystmark(object):
+    ''' An asyncio counterpart of :class:`Pystmark`, for use in
+    ``async def`` views. Its methods are coroutines that take the same
+    arguments and return the same responses as their :class:`Pystmark`
+    equivalents. It is configured by the same settings.
+
+    Requests are made with `httpx`_, which must be installed. Each event
+    loop has its own connection pool. Request arguments are passed to
+    :meth:`httpx.AsyncClient.request`.
+
+    .. _httpx: https://www.python-httpx.org/
+
+    :param app: Flask app to initialize with. Defaults to `None`
+    '''
+
+    def __init__(self, app=None):
+        if httpx is None:  # pragma: no cover
+            raise RuntimeError('AsyncPystmark requires httpx to be installed')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ''' Initialize AsyncPystmark with a Flask app '''
+        app.extensions['pystmark_async'] = _AsyncPystmarkState(app)
+
+    async def close(self, app=None):
+        '''Close the app's pooled connections for the running event loop.
+
+        :param app: Flask app whose pool to close. Defaults to `current_app`.
+        '''
+        if app is None:
+            app = current_app
+        await app.extensions['pystmark_async'].close()
+
+    async def send(self, message, **request_args):
+        ''' Send a message. See :meth:`Pystmark.send` '''
+        return await self._pystmark_call(send, message, **request_args)
+
+    async def send_batch(self, messages, **request_args):
+        ''' Send a batch of messages. See :meth:`Pystmark.send_batch` '''
+        return await self._pystmark_call(send_batch, messages,
+                                         **request_args)
+
+    async def get_delivery_stats(self, **request_args):
+        '''Get delivery stats for your Postmark account. See
+        :meth:`Pystmark.get_delivery_stats`
+        '''
+        return await self._pystmark_call(get_delivery_stats, **request_args)
+
+    async def get_bounces(self, **request_args):
+        ''' Get a paginated list of bounces. See :meth:`Pystmark.get_bounces`
+        '''
+        return await self._pystmark_call(get_bounces, **request_args)
+
+    async def get_bounce_tags(self, **request_args):
+        '''Get a list of tags for bounces associated with your Postmark server.
+        See :meth:`Pystmark.get_bounce_tags`
+        '''
+        return await self._pystmark_call(get_bounce_tags, **request_args)
+
+    async def get_bounce(self, bounce_id, **request_args):
+        ''' Get a single bounce. See :meth:`Pystmark.get_bounce` '''
+        return await self._pystmark_call(get_bounce, bounce_id,
+                                         **request_args)
+
+    async def get_bounce_dump(self, bounce_id, **request_args):
+        '''Get the raw email dump for a single bounce. See
+        :meth:`Pystmark.get_bounce_dump`
+        '''
+        return await self._pystmark_call(get_bounce_dump, bounce_id,
+                                         **request_args)
+
+    async def activate_bounce(self, bounce_id, **request_args):
+        '''Activate a deactivated bounce. See :meth:`Pystmark.activate_bounce`
+        '''
+        return await self._pystmark_call(activate_bounce, bounce_id,
+                                         **request_args)
+
+    async def _pystmark_call(self, method, *args, **kwargs):
+        ''' Builds the request for a pystmark Simple API function with the
+        configured settings, and makes it on the event loop
+        '''
+        kwargs = Pystmark._apply_config(**kwargs)
+        state = current_app.extensions.get('pystmark_async')
+        if state is None:
+            err = 'AsyncPystmark was not initialized with this app'
+            raise RuntimeError(err)
+        prepare = _prepared_api[method]
+        interface, http_method, url, request_args = prepare(*args, **kwargs)
+        if 'data' in request_args:
+            request_args['content'] = request_args.pop('data')
+        response = await state.client.request(http_method, url,
+                                              **request_args)
+        return interface.response_class(response, sender=interface)
+
+
+class _PooledInterface(object):
+    ''' Mixin for pystmark interfaces that makes requests through a shared
+    :class:`requests.Session`, instead of :func:`requests.request` which
+    opens a new connection for every call.
+
+    :param session: The :class:`requests.Session` to make requests with.
+    '''
+
+    def __init__(self, session, **kwargs):
+        super(_PooledInterface, self).__init__(**kwargs)
+        self.session = session
+
+    def _request(self, url, **kwargs):
+        response = self.session.request(self.method, url, **kwargs)
+        return self.response_class(response, sender=self)
+
+
+class _PreparedInterface(object):
+    ''' Mixin for pystmark interfaces that returns the interface, HTTP
+    method, url and request arguments of the request instead of making it
+    '''
+
+    def _request(self, url, **kwargs):
+        return self, self.method, url, kwargs
+
+
+# Maps the pystmark Simple API to the interface class and method name
+# it delegates to
+_simple_api = {
+    send: (Sender, 'send'),
+    send_batch: (BatchSender, 'send'),
+    get_delivery_stats: (DeliveryStats, 'get'),
+    get_bounces: (Bounces, 'get'),
+    get_bounce: (Bounce, 'get'),
+    get_bounce_dump: (BounceDump, 'get'),
+    get_bounce_tags: (BounceTags, 'get'),
+    activate_bounce: (BounceActivate, 'activate'),
+}
+
+
+def _interface_method(mixin, method, *args):
+    '''Returns the interface method that a pystmark Simple API function
+    delegates to, bound to an instance of the interface extended by `mixin`.
+
+    :param mixin: Class to extend the interface with.
+    :param method: A pystmark Simple API function.
+    :param \\*args: Arguments to construct the interface with.
+    '''
+    interface_class, name = _simple_api[method]
+    extended_class = type(interface_class.__name__,
+                          (mixin, interface_class), {})
+    return getattr(extended_class(*args), name)
+
+
+_prepared_api = dict((method, _interface_method(_PreparedInterface, method))
+                     for method in _simple_api)
+
+
+class _PystmarkState(object):
+    ''' Per-app state of the extension, stored in
+    ``app.extensions['pystmark']``.
+
+    The connection pool is created on first use, from the app's
+    configuration at that time. It is safe to share between threads.
+
+    :param app: The Flask app.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._session = None
+        self._methods = {}
+        self._executor = None
+        self._outbox = None
+        self._outbox_worker = None
+        atexit.register(_close_state, weakref.ref(self))
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=partial(_reset_state,
+                                                       weakref.ref(self)))
+
+    @property
+    def session(self):
+        ''' The pooled :class:`requests.Session` for the app '''
+        with self._lock:
+            if self._session is None:
+                self._session = self._create_session()
+            return self._session
+
+    @property
+    def executor(self):
+        ''' The :class:`_BoundedExecutor` that runs background sends '''
+        with self._lock:
+            if self._executor is None:
+                config = self.app.config
+                self._executor = _BoundedExecutor(
+                    config.get('PYSTMARK_ASYNC_WORKERS', 4),
+                    config.get('PYSTMARK_ASYNC_QUEUE_SIZE', 100),
+                    config.get('PYSTMARK_ASYNC_QUEUE_FULL', 'block'),
+                    logger=self.app.logger)
+            return self._executor
+
+    @property
+    def outbox(self):
+        ''' The app's :class:`Outbox`, or `None` if PYSTMARK_OUTBOX is not
+        set
+        '''
+        with self._lock:
+            if self._outbox is None:
+                config = self.app.config
+                path = config.get('PYSTMARK_OUTBOX')
+                if path is not None:
+                    self._outbox = Outbox(path, visibility_timeout=config.get(
+                        'PYSTMARK_OUTBOX_VISIBILITY_TIMEOUT', 60))
+            return self._outbox
+
+    def notify_outbox_worker(self):
+        ''' Wakes the outbox worker thread, starting it if needed, unless
+        PYSTMARK_OUTBOX_WORKER is `False`
+        '''
+        config = self.app.config
+        if not config.get('PYSTMARK_OUTBOX_WORKER', True):
+            return
+        with self._lock:
+            if self._outbox_worker is None:
+                self._outbox_worker = _OutboxWorker(
+                    self.app, config.get('PYSTMARK_OUTBOX_POLL_INTERVAL', 1))
+                self._outbox_worker.start()
+            self._outbox_worker.wake.set()
+
+    def resolve(self, method):
+        '''Returns the equivalent of a pystmark Simple API function that
+        uses the app's connection pool. Unknown callables are returned
+        unchanged.
+
+        :param method: A pystmark Simple API function.
+        '''
+        pooled = self._methods.get(method)
+        if pooled is not None:
+            return pooled
+        if method not in _simple_api:
+            return method
+        session = self.session
+        pooled = _interface_method(_PooledInterface, method, session)
+        with self._lock:
+            if self._session is not session:
+                # The pool was closed while this method was being created
+                return method
+            return self._methods.setdefault(method, pooled)
+
+    def close(self):
+        '''Stops the outbox worker once its current batch is sent, waits for
+        queued background sends, then closes the connection pool
+        '''
+        with self._lock:
+            worker = self._outbox_worker
+            self._outbox_worker = None
+        if worker is not None:
+            worker.stop()
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._lock:
+            session = self._session
+            self._session = None
+            self._methods = {}
+        if session is not None:
+            session.close()
+
+    def _create_session(self):
+        config = self.app.config
+        session = Session()
+        adapter = HTTPAdapter(
+            pool_maxsize=config.get('PYSTMARK_POOL_SIZE', 10),
+            pool_block=config.get('PYSTMARK_POOL_BLOCK', False))
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not config.get('PYSTMARK_KEEP_ALIVE', True):
+            session.headers['Connection'] = 'close'
+        return session
+
+
+class _AsyncPystmarkState(object):
+    ''' Per-app state of :class:`AsyncPystmark`, stored in
+    ``app.extensions['pystmark_async']``.
+
+    An :class:`httpx.AsyncClient` can only be used by the event loop it was
+    created in, so one is created for each event loop on first use.
+
+    :param app: The Flask app.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self):
+        ''' The :class:`httpx.AsyncClient` for the running event loop '''
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self._create_client()
+        return client
+
+    async def close(self):
+        ''' Closes the connection pool of the running event loop '''
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def _create_client(self):
+        config = self.app.config
+        pool_size = config.get('PYSTMARK_POOL_SIZE', 10)
+        limits = httpx.Limits(
+            max_connections=(pool_size if config.get('PYSTMARK_POOL_BLOCK')
+                             else None),
+            max_keepalive_connections=(
+                pool_size if config.get('PYSTMARK_KEEP_ALIVE', True) else 0))
+        return httpx.AsyncClient(limits=limits)
+
+
+class _BoundedExecutor(object):
+    ''' A thread pool whose queue of pending calls is bounded.
+
+    :param max_workers: Number of worker threads.
+    :param queue_size: Number of calls that may wait for a free worker.
+    :param on_full: What to do when the queue is full. ``'block'`` waits for
+        room in the queue, ``'drop'`` discards the call and returns a
+        cancelled future and ``'raise'`` raises :class:`QueueFullError`.
+    :param logger: Logger to warn about dropped calls. Defaults to `None`.
+    '''
+
+    _on_full_choices = ('block', 'drop', 'raise')
+
+    def __init__(self, max_workers, queue_size, on_full='block',
+                 logger=None):
+        if on_full not in self._on_full_choices:
+            err = 'Invalid PYSTMARK_ASYNC_QUEUE_FULL value "{0}"'
+            raise ValueError(err.format(on_full))
+        self.on_full = on_full
+        self.logger = logger
+        self._slots = threading.BoundedSemaphore(max_workers + queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='pystmark')
+
+    def submit(self, fn, *args, **kwargs):
+        '''Schedules `fn(*args, **kwargs)` to run in a worker thread.
+
+        :rtype: :class:`concurrent.futures.Future`
+        '''
+        if not self._slots.acquire(self.on_full == 'block'):
+            if self.on_full == 'raise':
+                raise QueueFullError()
+            if self.logger is not None:
+                self.logger.warning('Pystmark queue is full, dropping call '
+                                    'to %s', getattr(fn, '__name__', fn))
+            future = Future()
+            future.cancel()
+            return future
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def shutdown(self, wait=True):
+        ''' Stops accepting calls, optionally waiting for queued calls to
+        finish
+        '''
+        self._executor.shutdown(wait=wait)
+
+    def _release(self, future):
+        self._slots.release()
+
+
+class BulkSendResponse(object):
+    '''The combined responses of the batches sent by
+    :meth:`Pystmark.send_bulk`.
+
+    :param responses: The response to each batch, in the order sent.
+    :type responses: A list of :class:`pystmark.BatchSendResponse`
+    '''
+
+    def __init__(self, responses):
+        #: The :class:`pystmark.BatchSendResponse` of each batch
+        self.responses = responses
+        #: A :class:`pystmark.MessageConfirmation` for each message, in the
+        #: same order as the messages sent
+        self.messages = [message for response in responses
+                         for message in response.messages]
+
+    def raise_for_status(self):
+        ''' Raises the error of the first batch that failed, if any '''
+        for response in self.responses:
+            response.raise_for_status()
+
+
+class QueuedResponse(object):
+    '''Returned by :meth:`Pystmark.send` when the message was saved in the
+    outbox, to be sent later.
+
+    :param id: ID of the message in the outbox.
+    '''
+
+    def __init__(self, id):
+        #: ID of the message in the outbox
+        self.id = id
+
+    def raise_for_status(self):
+        ''' Does nothing, since the message has not been sent yet '''
+
+
+class Outbox(object):
+    '''A durable queue of messages waiting to be sent, stored in a SQLite
+    database. It can be shared by threads and processes.
+
+    Messages are delivered at least once. A message taken from the outbox
+    with :meth:`reserve` is hidden from other readers until it is removed
+    with :meth:`ack`, or until `visibility_timeout` seconds pass, after which
+    it is taken again. That way messages are not lost if the process sending
+    them crashes.
+
+    :param path: Path of the SQLite database file. It is created if needed.
+    :param visibility_timeout: Seconds before a reserved message that was not
+        acknowledged can be reserved again. Defaults to `60`.
+    '''
+
+    def __init__(self, path, visibility_timeout=60):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self._local = threading.local()
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS pystmark_outbox ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'message TEXT NOT NULL, '
+            'request_args TEXT NOT NULL, '
+            'visible_at REAL NOT NULL)')
+        self._connect().execute(
+            'CREATE INDEX IF NOT EXISTS pystmark_outbox_visible_at '
+            'ON pystmark_outbox (visible_at)')
+
+    def put(self, message, request_args=None):
+        '''Verifies a message and adds it to the outbox.
+
+        :param message: Message to send.
+        :type message: `dict` or :class:`Message`
+        :param request_args: Keyword arguments to pass to
+            :func:`requests.request` when sending the message. They must be
+            JSON serializable.
+        :raises: :class:`pystmark.MessageError` if the message is invalid.
+        :rtype: The message's ID in the outbox.
+        '''
+        if isinstance(message, Mapping):
+            message = _Message.load_message(message)
+        message.verify()
+        cursor = self._connect().execute(
+            'INSERT INTO pystmark_outbox (message, request_args, visible_at) '
+            'VALUES (?, ?, ?)',
+            (json.dumps(message.data()),
+             json.dumps(request_args or {}, sort_keys=True), time.time()))
+        return cursor.lastrowid
+
+    def reserve(self, limit=MAX_BATCH_MESSAGES):
+        '''Takes up to `limit` of the oldest visible messages from the outbox
+        and hides them for `visibility_timeout` seconds.
+
+        :param limit: Maximum number of messages to take.
+        :rtype: A list of `(id, message, request_args)`, where `message` is a
+            `dict` of Postmark message data and `request_args` is a JSON
+            encoded `dict`.
+        '''
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT id, message, request_args FROM pystmark_outbox '
+                'WHERE visible_at <= ? ORDER BY id LIMIT ?',
+                (now, limit)).fetchall()
+            conn.executemany(
+                'UPDATE pystmark_outbox SET visible_at = ? WHERE id = ?',
+                [(now + self.visibility_timeout, row[0]) for row in rows])
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return [(row_id, json.loads(message), request_args)
+                for row_id, message, request_args in rows]
+
+    def ack(self, ids):
+        '''Removes reserved messages from the outbox.
+
+        :param ids: IDs of the messages to remove.
+        '''
+        self._connect().executemany('DELETE FROM pystmark_outbox WHERE id = ?',
+                                    [(row_id,) for row_id in ids])
+
+    def release(self, ids):
+        '''Makes reserved messages visible again, without waiting for the
+        visibility timeout.
+
+        :param ids: IDs of the messages to release.
+        '''
+        self._connect().executemany(
+            'UPDATE pystmark_outbox SET visible_at = ? WHERE id = ?',
+            [(time.time(), row_id) for row_id in ids])
+
+    def __len__(self):
+        ''' Number of messages in the outbox, including reserved ones '''
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM pystmark_outbox').fetchone()[0]
+
+    def _connect(self):
+        ''' Returns this thread's connection to the database. SQLite
+        connections can not be shared between threads or processes.
+        '''
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            local.connection = conn
+            local.pid = os.getpid()
+        return local.connection
+
+
+class _OutboxWorker(threading.Thread):
+    '''Background thread that sends messages from an app's outbox. It waits
+    `poll_interval` seconds when the outbox is empty, unless woken up by
+    setting :attr:`wake`.
+
+    :param app: The Flask app.
+    :param poll_interval: Seconds between checks of an empty outbox.
+    '''
+
+    def __init__(self, app, poll_interval):
+        super(_OutboxWorker, self).__init__(name='pystmark-outbox')
+        self.daemon = True
+        self.app = app
+        self.poll_interval = poll_interval
+        self.wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    drained = self.app.pystmark.drain_outbox()
+            except Exception:
+                self.app.logger.exception('Failed to drain the outbox')
+                drained = 0
+            if not drained:
+                self.wake.wait(self.poll_interval)
+                self.wake.clear()
+
+    def stop(self):
+        ''' Stops the thread once its current batch is sent '''
+        self._stopping.set()
+        self.wake.set()
+        self.join()
+
+
+class QueueFullError(PystmarkError):
+    ''' Raised when the queue for background sends is full '''
+    message = 'Pystmark queue is full'
+
+
+def _batches(messages, size):
+    ''' Yields lists of up to `size` items taken from `messages` '''
+    messages = iter(messages)
+    while True:
+        batch = list(islice(messages, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _call_in_app_context(app, method, *args, **kwargs):
+    ''' Calls `method` inside an app context for `app` '''
+    with app.app_context():
+        return method(*args, **kwargs)
+
+
+def _reset_state(state_ref):
+    '''Fork hook that discards the connection pool, threads and locks a
+    child process inherited from its parent in a :class:`_PystmarkState`,
+    without closing the parent's connections.
+    '''
+    state = state_ref()
+    if state is not None:
+        state._lock = threading.Lock()
+        state._session = None
+        state._methods = {}
+        state._executor = None
+        state._outbox_worker = None
+
+
+def _close_state(state_ref):
+    ''' atexit hook to close the connection pool of a
+    :class:`_PystmarkState`, if it is still alive
+    '''
+    state = state_ref()
+    if state is not None:
+        state.close()
+
+
 class Message(_Message):
     ''' A container for message(s) to send to the Postmark API.
     You can populate this message with defaults for initializing an
@@ -180,3 +1005,104 @@ class Message(_Message):
                                       text=text, reply_to=reply_to,
                                       headers=headers, attachments=attachments,
                                       verify=verify, track_opens=track_opens)
+
+
+cli = AppGroup('pystmark', help='Flask-Pystmark commands.')
+
+
+@cli.command('worker')
+@click.option('--concurrency', '-c', default=1, show_default=True,
+              help='Number of workers.')
+@click.option('--processes', is_flag=True,
+              help='Run the workers as processes instead of threads.')
+@click.option('--batch-size', default=MAX_BATCH_MESSAGES, show_default=True,
+              help='Maximum number of messages sent by each request.')
+@click.option('--log-interval', default=60.0, show_default=True,
+              help='Seconds between throughput and backlog reports.')
+def worker_command(concurrency, processes, batch_size, log_interval):
+    '''Send messages from the outbox.
+
+    Runs until it receives SIGTERM or SIGINT, then stops once the batches
+    being sent are done.
+    '''
+    app = current_app._get_current_object()
+    outbox = app.extensions['pystmark'].outbox
+    if outbox is None:
+        raise click.UsageError('PYSTMARK_OUTBOX is not configured')
+    if processes:
+        context = multiprocessing.get_context('fork')
+        worker_class = context.Process
+    else:
+        context = multiprocessing
+        worker_class = threading.Thread
+    stopping = context.Event()
+    sent = context.Value('q', 0)
+    poll_interval = app.config.get('PYSTMARK_OUTBOX_POLL_INTERVAL', 1)
+    target = (_drain_outbox_in_process if processes
+              else _drain_outbox_until_stopped)
+    workers = [worker_class(target=target,
+                            args=(app, stopping, sent, batch_size,
+                                  poll_interval),
+                            name='pystmark-worker-{0}'.format(i))
+               for i in range(concurrency)]
+    # The signal handler interrupts the main thread, so it must not touch
+    # `stopping`, which may be a multiprocessing.Event the main thread is
+    # waiting on
+    stop_requested = threading.Event()
+
+    def stop(signum, frame):
+        stop_requested.set()
+    handlers = dict((signum, signal.signal(signum, stop))
+                    for signum in (signal.SIGTERM, signal.SIGINT))
+    try:
+        for worker in workers:
+            worker.start()
+        click.echo('Started {0} outbox worker {1}'.format(
+            concurrency, 'processes' if processes else 'threads'), err=True)
+        last_sent, last_time = 0, time.time()
+        while not stop_requested.wait(log_interval):
+            now = time.time()
+            total = sent.value
+            click.echo('Sent {0} messages ({1:.1f}/s), {2} in the '
+                       'outbox'.format(total, (total - last_sent) /
+                                       (now - last_time), len(outbox)),
+                       err=True)
+            last_sent, last_time = total, now
+        click.echo('Stopping, waiting for batches in progress', err=True)
+        stopping.set()
+        for worker in workers:
+            worker.join()
+    finally:
+        stopping.set()
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+    click.echo('Stopped after sending {0} messages, {1} in the '
+               'outbox'.format(sent.value, len(outbox)), err=True)
+
+
+def _drain_outbox_in_process(*args):
+    '''Runs :func:`_drain_outbox_until_stopped` in a worker process, which
+    leaves SIGTERM and SIGINT to the parent process, so that batches in
+    progress are not interrupted.
+    '''
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _drain_outbox_until_stopped(*args)
+
+
+def _drain_outbox_until_stopped(app, stopping, sent, batch_size,
+                                poll_interval):
+    '''Sends messages from the app's outbox until `stopping` is set,
+    adding the number of messages sent to `sent`.
+    '''
+    while not stopping.is_set():
+        try:
+            with app.app_context():
+                drained = app.pystmark.drain_outbox(batch_size)
+        except Exception:
+            app.logger.exception('Failed to drain the outbox')
+            drained = 0
+        with sent.get_lock():
+            sent.value += drained
+        if not drained:
+            stopping.wait(poll_interval)
@@ -44,7 +44,8 @@ class Test(Command):
 
     _files = ['__about__.py', 'flask_pystmark.py']
 
-    _test_requirements = ['flake8', 'nose', 'disabledoc', 'coverage', 'mock']
+    _test_requirements = ['flake8', 'nose', 'disabledoc', 'coverage', 'mock',
+                          'httpx']
 
     @property
     def files(self):
@@ -149,12 +150,16 @@ setup(
     install_requires=[
         'Flask', 'pystmark'
     ],
+    extras_require={
+        'async': ['httpx'],
+    },
     tests_require=[
         'nose',
         'coverage',
         'disabledoc',
         'mock',
         'flake8',
+        'httpx',
     ],
     classifiers=[
         'Environment :: Web Environment',
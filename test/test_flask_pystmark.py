@@ -1,8 +1,34 @@
+import asyncio
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import httpx
 import pystmark
+import requests
+from concurrent.futures import CancelledError
 from mock import patch
 from unittest import TestCase
-from flask import Flask
-from flask_pystmark import Pystmark, Message
+from flask import Flask, current_app
+from flask_pystmark import (Pystmark, AsyncPystmark, Message, Outbox,
+                            BulkSendResponse, QueuedResponse, QueueFullError)
+
+
+def make_bounce(bounce_id, email='bounced@example.com'):
+    return dict(ID=bounce_id, Type='HardBounce', MessageID='x', TypeCode=1,
+                Details='', Email=email, BouncedAt='2013-01-01T00:00:00',
+                DumpAvailable=False, Inactive=True, CanActivate=True,
+                Subject='Hi')
+
+
+def make_response(response_class, data, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b'' if data is None else json.dumps(data).encode()
+    return response_class(response)
 
 
 class FlaskPystmarkCreateTestBase(TestCase):
@@ -177,6 +203,724 @@ class FlaskPystmarkInternalsTest(FlaskPystmarkTestBase):
                                      secure=True, headers=self.headers)
 
 
+class FlaskPystmarkPoolTest(FlaskPystmarkTestBase):
+
+    def tearDown(self):
+        self.p.close()
+        super(FlaskPystmarkPoolTest, self).tearDown()
+
+    def test_init_app_state(self):
+        state = self.app.extensions['pystmark']
+        self.assertEqual(state.app, self.app)
+        self.assertTrue(self.p._get_state() is state)
+
+    def test_session_reused(self):
+        session = self.app.extensions['pystmark'].session
+        self.assertTrue(self.app.extensions['pystmark'].session is session)
+
+    def test_session_config(self):
+        self.app.config['PYSTMARK_POOL_SIZE'] = 3
+        self.app.config['PYSTMARK_POOL_BLOCK'] = True
+        self.app.config['PYSTMARK_KEEP_ALIVE'] = False
+        session = self.app.extensions['pystmark'].session
+        adapter = session.get_adapter('https://api.postmarkapp.com/')
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertTrue(adapter._pool_block)
+        self.assertEqual(session.headers['Connection'], 'close')
+
+    def test_resolve_unknown(self):
+        method = lambda: None  # noqa
+        state = self.app.extensions['pystmark']
+        self.assertTrue(state.resolve(method) is method)
+
+    def test_resolve_cached(self):
+        state = self.app.extensions['pystmark']
+        self.assertTrue(state.resolve(pystmark.send) is
+                        state.resolve(pystmark.send))
+
+    @patch('requests.Session.request')
+    def test_pooled_send(self, mock_request):
+        mock_request.return_value.json.return_value = dict(ErrorCode=0)
+        resp = self.p.send(Message(to='me@example.com', text='hi'))
+        self.assertTrue(isinstance(resp, pystmark.SendResponse))
+        args, kwargs = mock_request.call_args
+        self.assertEqual(args, ('POST',
+                                'https://api.postmarkapp.com/email'))
+        self.assertEqual(kwargs['headers']['X-Postmark-Server-Token'],
+                         self.api_key)
+
+    @patch('requests.Session.request')
+    def test_pooled_get_bounce(self, mock_request):
+        mock_request.return_value.json.return_value = make_bounce(1)
+        resp = self.p.get_bounce(1)
+        self.assertTrue(isinstance(resp, pystmark.BounceResponse))
+        args, kwargs = mock_request.call_args
+        self.assertEqual(args, ('GET',
+                                'https://api.postmarkapp.com/bounces/1'))
+
+    @patch('requests.Session.close')
+    def test_close(self, mock_close):
+        state = self.app.extensions['pystmark']
+        state.resolve(pystmark.send)
+        self.p.close()
+        mock_close.assert_called_once_with()
+        self.assertEqual(state._methods, {})
+        self.assertTrue(state._session is None)
+
+    def test_close_not_initialized(self):
+        app = Flask(__name__)
+        self.p.close(app)
+
+    def test_call_not_initialized(self):
+        app = Flask(__name__)
+        app.config['PYSTMARK_API_KEY'] = self.api_key
+        with app.app_context():
+            with patch('flask_pystmark.send') as mock_send:
+                Pystmark()._pystmark_call(mock_send, 'x')
+        mock_send.assert_called_with('x', api_key=self.api_key,
+                                     secure=True, test=False)
+
+    @patch('requests.Session.close')
+    def test_close_state_atexit(self, mock_close):
+        from flask_pystmark import _close_state
+        state = self.app.extensions['pystmark']
+        state.session
+        _close_state(lambda: state)
+        _close_state(lambda: None)
+        mock_close.assert_called_once_with()
+
+
+class FlaskPystmarkAsyncTest(FlaskPystmarkTestBase):
+
+    def tearDown(self):
+        self.p.close()
+        super(FlaskPystmarkAsyncTest, self).tearDown()
+
+    @patch.object(Pystmark, '_pystmark_call')
+    def test_send_async(self, mock_call):
+        apps = []
+
+        def call(*args, **kwargs):
+            apps.append(current_app._get_current_object())
+            return 'resp'
+        mock_call.side_effect = call
+        m = Message()
+        future = self.p.send_async(m, **self.req_args)
+        self.assertEqual(future.result(), 'resp')
+        self.assertEqual(apps, [self.app])
+        mock_call.assert_called_with(pystmark.send, m, headers=self.headers)
+
+    @patch.object(Pystmark, '_pystmark_call')
+    def test_send_batch_async(self, mock_call):
+        mock_call.return_value = 'resp'
+        msgs = [Message(text='thing'), Message(text='other')]
+        future = self.p.send_batch_async(msgs)
+        self.assertEqual(future.result(), 'resp')
+        mock_call.assert_called_with(pystmark.send_batch, msgs)
+
+    def test_send_async_not_initialized(self):
+        app = Flask(__name__)
+        with app.app_context():
+            self.assertRaises(RuntimeError, Pystmark().send_async, {})
+
+    def _fill_queue(self, on_full):
+        self.app.config['PYSTMARK_ASYNC_WORKERS'] = 1
+        self.app.config['PYSTMARK_ASYNC_QUEUE_SIZE'] = 1
+        self.app.config['PYSTMARK_ASYNC_QUEUE_FULL'] = on_full
+        release = threading.Event()
+        patcher = patch.object(Pystmark, '_pystmark_call')
+        mock_call = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(release.set)
+        mock_call.side_effect = lambda *args, **kwargs: release.wait()
+        futures = [self.p.send_async({}), self.p.send_async({})]
+        return release, futures
+
+    def test_queue_full_raise(self):
+        release, futures = self._fill_queue('raise')
+        self.assertRaises(QueueFullError, self.p.send_async, {})
+        release.set()
+        for future in futures:
+            self.assertTrue(future.result())
+
+    def test_queue_full_drop(self):
+        release, futures = self._fill_queue('drop')
+        future = self.p.send_async({})
+        self.assertRaises(CancelledError, future.result)
+        release.set()
+        # A slot frees up once the queued calls finish
+        for future in futures:
+            future.result()
+        self.assertTrue(self.p.send_async({}).result())
+
+    def test_queue_full_invalid(self):
+        self.app.config['PYSTMARK_ASYNC_QUEUE_FULL'] = 'whatever'
+        self.assertRaises(ValueError, self.p.send_async, {})
+
+    @patch.object(Pystmark, '_pystmark_call')
+    def test_close_waits_for_queue(self, mock_call):
+        mock_call.return_value = 'resp'
+        futures = [self.p.send_async({}) for _ in range(10)]
+        self.p.close()
+        self.assertTrue(all(f.done() for f in futures))
+
+    def test_submit_error_releases_slot(self):
+        executor = self.app.extensions['pystmark'].executor
+        executor.shutdown()
+        self.assertRaises(RuntimeError, self.p.send_async, {})
+        self.assertEqual(executor._slots._value, 104)
+
+
+class FlaskPystmarkBulkTest(FlaskPystmarkTestBase):
+
+    def setUp(self):
+        super(FlaskPystmarkBulkTest, self).setUp()
+        patcher = patch.object(Pystmark, 'send_batch')
+        self.mock_send_batch = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_send_batch.side_effect = self._send_batch
+        self.apps = []
+
+    def _send_batch(self, messages, **request_args):
+        self.apps.append(current_app._get_current_object())
+        data = [dict(ErrorCode=0, MessageID=str(m)) for m in messages]
+        return make_response(pystmark.BatchSendResponse, data)
+
+    def _ids(self, resp):
+        return [int(m.id) for m in resp.messages]
+
+    def test_send_bulk_chunks(self):
+        msgs = list(range(1201))
+        resp = self.p.send_bulk(msgs, **self.req_args)
+        self.assertEqual(self._ids(resp), msgs)
+        self.assertEqual([len(r.messages) for r in resp.responses],
+                         [500, 500, 201])
+        self.mock_send_batch.assert_called_with(msgs[1000:],
+                                                headers=self.headers)
+        self.assertEqual(self.apps, [self.app] * 3)
+
+    def test_send_bulk_batch_size(self):
+        self.app.config['PYSTMARK_BULK_BATCH_SIZE'] = 10
+        resp = self.p.send_bulk(list(range(25)))
+        self.assertEqual([len(r.messages) for r in resp.responses],
+                         [10, 10, 5])
+
+    def test_send_bulk_batch_size_capped(self):
+        self.app.config['PYSTMARK_BULK_BATCH_SIZE'] = 1000
+        resp = self.p.send_bulk(list(range(1000)))
+        self.assertEqual(len(resp.responses), 2)
+
+    def test_send_bulk_serial(self):
+        self.app.config['PYSTMARK_BULK_PARALLELISM'] = 1
+        msgs = list(range(1000))
+        resp = self.p.send_bulk(msgs)
+        self.assertEqual(self._ids(resp), msgs)
+        self.assertEqual(len(resp.responses), 2)
+
+    def test_send_bulk_parallel(self):
+        self.app.config['PYSTMARK_BULK_BATCH_SIZE'] = 1
+        self.app.config['PYSTMARK_BULK_PARALLELISM'] = 3
+        barrier = threading.Barrier(3, timeout=5)
+
+        def send_batch(messages, **request_args):
+            barrier.wait()
+            return self._send_batch(messages)
+        self.mock_send_batch.side_effect = send_batch
+        resp = self.p.send_bulk([1, 2, 3])
+        self.assertEqual(self._ids(resp), [1, 2, 3])
+
+    def test_send_bulk_error(self):
+        self.app.config['PYSTMARK_BULK_BATCH_SIZE'] = 1
+
+        def send_batch(messages, **request_args):
+            if messages == [2]:
+                raise ValueError()
+            return self._send_batch(messages)
+        self.mock_send_batch.side_effect = send_batch
+        self.assertRaises(ValueError, self.p.send_bulk, [1, 2, 3])
+
+    def test_send_bulk_empty(self):
+        self.assertRaises(pystmark.MessageError, self.p.send_bulk, [])
+
+    def test_send_stream(self):
+        self.app.config['PYSTMARK_BULK_BATCH_SIZE'] = 2
+        resps = self.p.send_stream(iter(range(5)), **self.req_args)
+        self.assertEqual([self._ids(r) for r in resps], [[0, 1], [2, 3], [4]])
+        self.mock_send_batch.assert_called_with([4], headers=self.headers)
+        self.assertEqual(self.apps, [self.app] * 3)
+
+    def test_send_stream_empty(self):
+        self.assertEqual(list(self.p.send_stream(iter([]))), [])
+
+    def test_send_stream_lazy(self):
+        self.app.config['PYSTMARK_BULK_BATCH_SIZE'] = 10
+        self.app.config['PYSTMARK_BULK_PARALLELISM'] = 2
+        taken = []
+
+        def messages():
+            for i in range(1000):
+                taken.append(i)
+                yield i
+        resps = self.p.send_stream(messages())
+        self.assertEqual(taken, [])
+        self.assertEqual(self._ids(next(resps)), list(range(10)))
+        # Only the batches in flight have been taken from the generator
+        self.assertEqual(len(taken), 20)
+        self.assertEqual(self._ids(next(resps)), list(range(10, 20)))
+        self.assertEqual(len(taken), 30)
+        resps.close()
+        self.assertEqual(len(taken), 30)
+
+    def test_send_stream_close_cancels(self):
+        self.app.config['PYSTMARK_BULK_BATCH_SIZE'] = 1
+        self.app.config['PYSTMARK_BULK_PARALLELISM'] = 3
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def send_batch(messages, **request_args):
+            if messages != [0]:
+                release.wait(5)
+            return self._send_batch(messages)
+        self.mock_send_batch.side_effect = send_batch
+        resps = self.p.send_stream(iter(range(100)))
+        self.assertEqual(self._ids(next(resps)), [0])
+        release.set()
+        resps.close()
+        self.assertTrue(self.mock_send_batch.call_count <= 4)
+
+    def test_raise_for_status(self):
+        resp = BulkSendResponse([
+            make_response(pystmark.BatchSendResponse, []),
+            make_response(pystmark.BatchSendResponse, []),
+        ])
+        resp.raise_for_status()
+        resp.responses.append(make_response(pystmark.BatchSendResponse,
+                                            None, 401))
+        self.assertRaises(pystmark.UnauthorizedError, resp.raise_for_status)
+
+
+class FlaskPystmarkOutboxTest(FlaskPystmarkTestBase):
+
+    def setUp(self):
+        super(FlaskPystmarkOutboxTest, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'outbox.db')
+        self.app.config['PYSTMARK_OUTBOX'] = self.path
+        self.app.config['PYSTMARK_OUTBOX_WORKER'] = False
+        self.addCleanup(self.p.close, self.app)
+        self.batch_data = None
+
+    def _message(self, to='me@example.com'):
+        return Message(to=to, text='hi')
+
+    def _send_batch(self, messages, **request_args):
+        data = self.batch_data or [dict(ErrorCode=0) for m in messages]
+        return make_response(pystmark.BatchSendResponse, data)
+
+    def test_outbox_disabled(self):
+        del self.app.config['PYSTMARK_OUTBOX']
+        self.assertTrue(self.app.extensions['pystmark'].outbox is None)
+        self.assertRaises(RuntimeError, self.p.drain_outbox)
+
+    def test_drain_not_initialized(self):
+        app = Flask(__name__)
+        with app.app_context():
+            self.assertRaises(RuntimeError, Pystmark().drain_outbox)
+
+    def test_put_reserve_ack(self):
+        outbox = Outbox(self.path)
+        id1 = outbox.put(self._message('a@example.com'))
+        id2 = outbox.put(dict(to='b@example.com', text='hi'),
+                         dict(headers=self.headers))
+        self.assertEqual(len(outbox), 2)
+        rows = outbox.reserve()
+        self.assertEqual(rows, [
+            (id1, dict(To='a@example.com', TextBody='hi'), '{}'),
+            (id2, dict(To='b@example.com', TextBody='hi'),
+             json.dumps(dict(headers=self.headers)))])
+        # Reserved messages are hidden
+        self.assertEqual(outbox.reserve(), [])
+        outbox.ack([id1, id2])
+        self.assertEqual(len(outbox), 0)
+
+    def test_put_verifies(self):
+        outbox = Outbox(self.path)
+        self.assertRaises(pystmark.MessageError, outbox.put, dict(text='x'))
+        self.assertEqual(len(outbox), 0)
+
+    def test_reserve_limit(self):
+        outbox = Outbox(self.path)
+        ids = [outbox.put(self._message()) for _ in range(5)]
+        self.assertEqual([r[0] for r in outbox.reserve(3)], ids[:3])
+        self.assertEqual([r[0] for r in outbox.reserve(3)], ids[3:])
+
+    def test_visibility_timeout(self):
+        outbox = Outbox(self.path, visibility_timeout=0.05)
+        message_id = outbox.put(self._message())
+        self.assertEqual(len(outbox.reserve()), 1)
+        self.assertEqual(outbox.reserve(), [])
+        time.sleep(0.1)
+        # The reservation expired, as if the process crashed
+        self.assertEqual(outbox.reserve()[0][0], message_id)
+
+    def test_release(self):
+        outbox = Outbox(self.path)
+        message_id = outbox.put(self._message())
+        outbox.reserve()
+        outbox.release([message_id])
+        self.assertEqual(outbox.reserve()[0][0], message_id)
+
+    def test_reserve_error_rolls_back(self):
+        outbox = Outbox(self.path)
+        outbox.put(self._message())
+        outbox.visibility_timeout = None
+        self.assertRaises(TypeError, outbox.reserve)
+        outbox.visibility_timeout = 60
+        self.assertEqual(len(outbox.reserve()), 1)
+
+    def test_shared_between_threads_and_instances(self):
+        outbox = Outbox(self.path)
+        other = Outbox(self.path)
+
+        def put():
+            for _ in range(10):
+                outbox.put(dict(to='me@example.com', text='hi'))
+        threads = [threading.Thread(target=put) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(other), 40)
+        self.assertEqual(len(other.reserve(100)), 40)
+        self.assertEqual(outbox.reserve(100), [])
+
+    def test_wal_mode(self):
+        outbox = Outbox(self.path)
+        mode = outbox._connect().execute('PRAGMA journal_mode').fetchone()
+        self.assertEqual(mode[0], 'wal')
+
+    @patch.object(Pystmark, '_pystmark_call')
+    def test_send_queues(self, mock_call):
+        resp = self.p.send(self._message(), **self.req_args)
+        self.assertTrue(isinstance(resp, QueuedResponse))
+        resp.raise_for_status()
+        self.assertFalse(mock_call.called)
+        outbox = self.app.extensions['pystmark'].outbox
+        self.assertEqual(outbox.reserve()[0][0], resp.id)
+
+    @patch.object(Pystmark, 'send_batch')
+    def test_drain_outbox(self, mock_send_batch):
+        mock_send_batch.side_effect = self._send_batch
+        self.p.send(self._message('a@example.com'))
+        self.p.send(self._message('b@example.com'), **self.req_args)
+        self.p.send(self._message('c@example.com'))
+        self.assertEqual(self.p.drain_outbox(), 3)
+        self.assertEqual(mock_send_batch.call_args_list[0][0][0], [
+            dict(To='a@example.com', TextBody='hi'),
+            dict(To='c@example.com', TextBody='hi')])
+        mock_send_batch.assert_called_with(
+            [dict(To='b@example.com', TextBody='hi')], headers=self.headers)
+        self.assertEqual(len(self.app.extensions['pystmark'].outbox), 0)
+        self.assertEqual(self.p.drain_outbox(), 0)
+
+    @patch.object(Pystmark, 'send_batch')
+    def test_drain_outbox_failure_retried(self, mock_send_batch):
+        self.app.config['PYSTMARK_OUTBOX_VISIBILITY_TIMEOUT'] = 0
+        mock_send_batch.side_effect = ValueError()
+        self.p.send(self._message())
+        self.assertEqual(self.p.drain_outbox(), 1)
+        self.assertEqual(len(self.app.extensions['pystmark'].outbox), 1)
+        mock_send_batch.side_effect = self._send_batch
+        self.assertEqual(self.p.drain_outbox(), 1)
+        self.assertEqual(len(self.app.extensions['pystmark'].outbox), 0)
+
+    @patch.object(Pystmark, 'send_batch')
+    def test_drain_outbox_http_error_retried(self, mock_send_batch):
+        mock_send_batch.return_value = make_response(
+            pystmark.BatchSendResponse, None, 500)
+        self.p.send(self._message())
+        self.p.drain_outbox()
+        self.assertEqual(len(self.app.extensions['pystmark'].outbox), 1)
+
+    @patch.object(Pystmark, 'send_batch')
+    def test_drain_outbox_rejected(self, mock_send_batch):
+        mock_send_batch.side_effect = self._send_batch
+        self.batch_data = [dict(ErrorCode=300, Message='Invalid email')]
+        self.p.send(self._message())
+        self.p.drain_outbox()
+        self.assertEqual(len(self.app.extensions['pystmark'].outbox), 0)
+
+    @patch.object(Pystmark, 'send_batch')
+    def test_worker(self, mock_send_batch):
+        self.app.config['PYSTMARK_OUTBOX_WORKER'] = True
+        self.app.config['PYSTMARK_OUTBOX_POLL_INTERVAL'] = 0.01
+        sent = threading.Event()
+
+        def send_batch(messages, **request_args):
+            sent.set()
+            return self._send_batch(messages)
+        mock_send_batch.side_effect = send_batch
+        self.p.send(self._message())
+        self.assertTrue(sent.wait(5))
+        self.p.close()
+        self.assertEqual(len(self.app.extensions['pystmark'].outbox), 0)
+
+    @patch.object(Pystmark, 'drain_outbox')
+    def test_worker_error(self, mock_drain):
+        self.app.config['PYSTMARK_OUTBOX_WORKER'] = True
+        self.app.config['PYSTMARK_OUTBOX_POLL_INTERVAL'] = 0.01
+        called = threading.Event()
+
+        def drain():
+            called.set()
+            raise ValueError()
+        mock_drain.side_effect = drain
+        self.p.send(self._message())
+        self.assertTrue(called.wait(5))
+        self.p.close()
+
+
+class FlaskPystmarkWorkerCommandTest(FlaskPystmarkTestBase):
+
+    def setUp(self):
+        super(FlaskPystmarkWorkerCommandTest, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.app.config['PYSTMARK_OUTBOX'] = os.path.join(self.tmpdir,
+                                                          'outbox.db')
+        self.app.config['PYSTMARK_OUTBOX_WORKER'] = False
+        self.app.config['PYSTMARK_OUTBOX_POLL_INTERVAL'] = 0.01
+        self.runner = self.app.test_cli_runner()
+        self.handlers = [signal.getsignal(signal.SIGTERM),
+                         signal.getsignal(signal.SIGINT)]
+
+    def _invoke(self, *args):
+        result = self.runner.invoke(args=['pystmark', 'worker'] + list(args))
+        self.assertEqual(self.handlers, [signal.getsignal(signal.SIGTERM),
+                                         signal.getsignal(signal.SIGINT)])
+        return result
+
+    def _stop_after(self, calls, result=0, pid=None):
+        pid = pid or os.getpid()
+        counter = [0]
+        lock = threading.Lock()
+
+        def drain(limit):
+            with lock:
+                counter[0] += 1
+                if counter[0] == calls:
+                    os.kill(pid, signal.SIGTERM)
+            return result
+        return drain
+
+    def test_registered(self):
+        self.assertTrue('pystmark' in self.app.cli.commands)
+
+    def test_outbox_not_configured(self):
+        del self.app.config['PYSTMARK_OUTBOX']
+        result = self._invoke()
+        self.assertEqual(result.exit_code, 2)
+        self.assertTrue('PYSTMARK_OUTBOX' in result.output)
+
+    @patch.object(Pystmark, 'drain_outbox')
+    def test_threads(self, mock_drain):
+        mock_drain.side_effect = self._stop_after(10, result=5)
+        result = self._invoke('-c', '3', '--batch-size', '5',
+                              '--log-interval', '0.01')
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertTrue('Started 3 outbox worker threads' in result.output)
+        self.assertTrue('Stopping' in result.output)
+        mock_drain.assert_called_with(5)
+        sent = int(result.output.split('Stopped after sending ')[1].split()[0])
+        self.assertEqual(sent, 5 * mock_drain.call_count)
+
+    @patch.object(Pystmark, 'drain_outbox')
+    def test_drain_error(self, mock_drain):
+        stop = self._stop_after(2)
+
+        def drain(limit):
+            stop(limit)
+            raise ValueError()
+        mock_drain.side_effect = drain
+        result = self._invoke()
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertTrue('Stopped after sending 0 messages' in result.output)
+
+    @patch.object(Pystmark, 'send_batch')
+    def test_processes(self, mock_send_batch):
+        parent = os.getpid()
+
+        def send_batch(messages, **request_args):
+            os.kill(parent, signal.SIGTERM)
+            return make_response(pystmark.BatchSendResponse,
+                                 [dict(ErrorCode=0)] * len(messages))
+        mock_send_batch.side_effect = send_batch
+        outbox = self.app.extensions['pystmark'].outbox
+        for _ in range(3):
+            outbox.put(dict(to='me@example.com', text='hi'))
+        result = self._invoke('--processes', '-c', '2')
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertTrue('Started 2 outbox worker processes' in result.output)
+        self.assertTrue('Stopped after sending 3 messages, 0 in the outbox'
+                        in result.output)
+
+    def test_reset_after_fork(self):
+        from flask_pystmark import _reset_state
+        import weakref
+        state = self.app.extensions['pystmark']
+        state.session
+        state.executor
+        _reset_state(weakref.ref(state))
+        self.assertTrue(state._session is None)
+        self.assertTrue(state._executor is None)
+        self.assertEqual(state._methods, {})
+        _reset_state(lambda: None)
+
+
+class FlaskPystmarkAsyncioTest(FlaskPystmarkTestBase):
+
+    def setUp(self):
+        super(FlaskPystmarkAsyncioTest, self).setUp()
+        self.ap = AsyncPystmark(app=self.app)
+        self.requests = []
+        self.response_data = dict(ErrorCode=0)
+        transport = httpx.MockTransport(self._handle)
+        client_class = httpx.AsyncClient
+
+        def make_client(**kwargs):
+            self.client_kwargs = kwargs
+            return client_class(transport=transport, **kwargs)
+        patcher = patch('flask_pystmark.httpx.AsyncClient', make_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _handle(self, request):
+        self.requests.append(request)
+        return httpx.Response(200, json=self.response_data)
+
+    def _run(self, coro_func, *args, **kwargs):
+        async def run():
+            try:
+                return await coro_func(*args, **kwargs)
+            finally:
+                await self.ap.close()
+        return asyncio.run(run())
+
+    def test_init_app(self):
+        self.assertTrue('pystmark_async' in self.app.extensions)
+
+    def test_send(self):
+        m = Message(to='me@example.com', text='hi')
+        resp = self._run(self.ap.send, m, **self.req_args)
+        self.assertTrue(isinstance(resp, pystmark.SendResponse))
+        resp.raise_for_status()
+        request = self.requests[0]
+        self.assertEqual(request.method, 'POST')
+        self.assertEqual(str(request.url), 'https://api.postmarkapp.com/email')
+        self.assertEqual(request.headers['X-Postmark-Server-Token'],
+                         self.api_key)
+        self.assertEqual(request.headers['whatever'], 'something')
+        self.assertEqual(json.loads(request.content),
+                         dict(To='me@example.com', TextBody='hi'))
+
+    def test_send_batch(self):
+        self.response_data = [dict(ErrorCode=0), dict(ErrorCode=0)]
+        msgs = [Message(to='a@example.com', text='a'),
+                Message(to='b@example.com', text='b')]
+        resp = self._run(self.ap.send_batch, msgs)
+        self.assertTrue(isinstance(resp, pystmark.BatchSendResponse))
+        self.assertEqual(len(resp.messages), 2)
+        self.assertEqual(str(self.requests[0].url),
+                         'https://api.postmarkapp.com/email/batch')
+
+    def test_send_many_concurrently(self):
+        async def send_many():
+            return await asyncio.gather(*[
+                self.ap.send(Message(to='me@example.com', text='hi'))
+                for _ in range(50)])
+        resps = self._run(send_many)
+        self.assertEqual(len(resps), 50)
+        self.assertEqual(len(self.requests), 50)
+
+    def test_test_api(self):
+        self.app.config['PYSTMARK_TEST_API'] = True
+        self.app.config['PYSTMARK_HTTPS'] = False
+        self._run(self.ap.get_delivery_stats)
+        request = self.requests[0]
+        self.assertEqual(str(request.url),
+                         'http://api.postmarkapp.com/deliverystats')
+        self.assertEqual(request.headers['X-Postmark-Server-Token'],
+                         'POSTMARK_API_TEST')
+
+    def test_get_bounces(self):
+        self.response_data = dict(TotalCount=1, Bounces=[make_bounce(1)])
+        resp = self._run(self.ap.get_bounces, count=10, offset=20)
+        self.assertEqual(resp.total, 1)
+        self.assertEqual(resp.bounces[0].id, 1)
+        self.assertEqual(self.requests[0].url.params['count'], '10')
+        self.assertEqual(self.requests[0].url.params['offset'], '20')
+
+    def test_get_bounce(self):
+        self.response_data = make_bounce(3)
+        resp = self._run(self.ap.get_bounce, 3)
+        self.assertEqual(resp.bounce.id, 3)
+        self.assertEqual(str(self.requests[0].url),
+                         'https://api.postmarkapp.com/bounces/3')
+
+    def test_get_bounce_dump(self):
+        self.response_data = dict(Body='dump')
+        resp = self._run(self.ap.get_bounce_dump, 3)
+        self.assertEqual(resp.dump, 'dump')
+
+    def test_get_bounce_tags(self):
+        self.response_data = ['a', 'b']
+        resp = self._run(self.ap.get_bounce_tags)
+        self.assertEqual(resp.tags, ['a', 'b'])
+
+    def test_activate_bounce(self):
+        self.response_data = dict(Message='OK', Bounce=make_bounce(3))
+        resp = self._run(self.ap.activate_bounce, 3)
+        self.assertEqual(resp.bounce.id, 3)
+        self.assertEqual(self.requests[0].method, 'PUT')
+
+    def test_client_per_loop(self):
+        state = self.app.extensions['pystmark_async']
+
+        async def get_client():
+            return state.client
+        c1 = asyncio.run(get_client())
+        c2 = asyncio.run(get_client())
+        self.assertFalse(c1 is c2)
+
+    def test_client_reused(self):
+        state = self.app.extensions['pystmark_async']
+
+        async def get_clients():
+            return state.client, state.client
+        c1, c2 = self._run(get_clients)
+        self.assertTrue(c1 is c2)
+
+    def test_client_limits(self):
+        self.app.config['PYSTMARK_POOL_SIZE'] = 3
+        self.app.config['PYSTMARK_POOL_BLOCK'] = True
+        self.app.config['PYSTMARK_KEEP_ALIVE'] = False
+        self._run(self.ap.get_bounce_tags)
+        limits = self.client_kwargs['limits']
+        self.assertEqual(limits.max_connections, 3)
+        self.assertEqual(limits.max_keepalive_connections, 0)
+
+    def test_close_without_client(self):
+        asyncio.run(self.ap.close(self.app))
+
+    def test_not_initialized(self):
+        app = Flask(__name__)
+        app.config['PYSTMARK_API_KEY'] = self.api_key
+        with app.app_context():
+            self.assertRaises(RuntimeError, asyncio.run,
+                              self.ap.get_bounce_tags())
+
+
 class FlaskPystmarkMessageTest(FlaskPystmarkCreateTestBase):
 
     @patch('flask_pystmark._Message.__init__')